@@ -1,12 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import os
+import stat
+import functools
+import anyio
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 import yaml
 import logging
-from .search_manager import SearchManager, SearchResult
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+from .search_manager import SearchManager, SearchResult, walk_directories
 
 
 # Setup logging
@@ -41,6 +51,118 @@ class FileInfo(BaseModel):
 VAULT_PATH = os.environ.get("VAULT_PATH", "/data/vault")
 
 
+def scan_dir(dir_path: str, depth: int = 1, executor: Optional[ThreadPoolExecutor] = None) -> FileInfo:
+    """Build the FileInfo tree below dir_path down to depth levels, scanning subdirectories on executor if given"""
+    is_dir = os.path.isdir(dir_path)
+    rel_path = os.path.relpath(dir_path, VAULT_PATH)
+    root = FileInfo(
+        name=os.path.basename(dir_path) or os.path.basename(VAULT_PATH),
+        path="" if rel_path == "." else rel_path,
+        type="directory" if is_dir else "file",
+        modified=datetime.fromtimestamp(os.path.getmtime(dir_path)),
+        children=[] if is_dir else None
+    )
+    if not is_dir:
+        return root
+
+    def visit(item):
+        parent, current, level = item
+        with os.scandir(current) as it:
+            entries = sorted((e for e in it if not e.name.startswith('.')), key=lambda e: e.name)
+
+        subdirs = []
+        for entry in entries:
+            entry_is_dir = entry.is_dir()
+            # Symlinked folders are listed as directories but not walked into
+            descend = entry_is_dir and not entry.is_symlink() and level < depth
+            child = FileInfo(
+                name=entry.name,
+                path=os.path.join(parent.path, entry.name) if parent.path else entry.name,
+                type="directory" if entry_is_dir else "file",
+                modified=datetime.fromtimestamp(entry.stat(follow_symlinks=False).st_mtime),
+                children=[] if descend else None
+            )
+            parent.children.append(child)
+            if descend:
+                subdirs.append((child, entry.path, level + 1))
+        return subdirs, None
+
+    for _ in walk_directories((root, dir_path, 1), visit, executor):
+        pass
+
+    return root
+
+
+# Files up to this size are cached after parsing, which bounds the cache to
+# roughly 4096 * 64 KiB; larger files are re-read on every request
+PARSE_CACHE_MAX_SIZE = 64 * 1024
+
+
+def _parse_file(path: str) -> Tuple[str, Dict]:
+    """Read a file and split off its frontmatter"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    frontmatter = {}
+    if content.startswith('---'):
+        # Only look for the closing delimiter instead of splitting the whole file
+        end = content.find('\n---', 3)
+        if end != -1:
+            try:
+                frontmatter = yaml.load(content[3:end], Loader=SafeLoader)
+                content = content[end + 4:].strip()
+            except:
+                pass
+
+    return content, frontmatter
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_file_cached(path: str, mtime_ns: int, size: int) -> Tuple[str, Dict]:
+    """Parse a file, cached on (path, mtime, size)"""
+    return _parse_file(path)
+
+
+def _read_file(
+    path: str,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None
+) -> Tuple[Dict[str, str], Optional[Tuple[str, Dict]]]:
+    """Stat a file and return its cache headers and (possibly cached) content and frontmatter.
+
+    The content is None when the client's copy is current: if_none_match matches
+    the file's ETag or, without an ETag, the file is not newer than if_modified_since.
+    """
+    st = os.stat(path)
+    if not stat.S_ISREG(st.st_mode):
+        raise IsADirectoryError(path)
+
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {"ETag": etag, "Last-Modified": formatdate(st.st_mtime, usegmt=True)}
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return headers, None
+    elif if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        # HTTP dates have whole-second precision
+        if since is not None and int(st.st_mtime) <= since:
+            return headers, None
+
+    if st.st_size > PARSE_CACHE_MAX_SIZE:
+        return headers, _parse_file(path)
+    return headers, _parse_file_cached(path, st.st_mtime_ns, st.st_size)
+
+
+def _write_file(path: str, content: str):
+    """Write content to a file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
 search_manager = None
 
 search_manager = None
@@ -66,13 +188,13 @@ async def shutdown_event():
 
 
 @app.get("/api/search", response_model=List[SearchResult])
-async def search(q: str, limit: int = 10):
+async def search(q: str, limit: int = Query(10, ge=1)):
     """Search vault contents"""
     if not search_manager:
         raise HTTPException(status_code=500, detail="Search index not initialized")
     
     try:
-        results = search_manager.search(q, limit)
+        results = await anyio.to_thread.run_sync(search_manager.search, q, limit)
         return results
     except Exception as e:
         logger.error(f"Search error: {e}")
@@ -85,7 +207,7 @@ async def reindex():
         raise HTTPException(status_code=500, detail="Search index not initialized")
     
     try:
-        search_manager.check_consistency()
+        await anyio.to_thread.run_sync(search_manager.check_consistency)
         return {"status": "success", "message": "Reindexing completed"}
     except Exception as e:
         logger.error(f"Reindex error: {e}")
@@ -94,91 +216,69 @@ async def reindex():
 @app.get("/api/tree")
 @app.get("/api/tree/")
 @app.get("/api/tree/{path:path}")
-async def get_directory_tree(path: str = ""):
-    """List directory contents"""
+async def get_directory_tree(path: str = "", depth: int = Query(1, ge=1)):
+    """List directory contents, descending depth levels (immediate children only by default)"""
     full_path = os.path.join(VAULT_PATH, path.lstrip("/"))
     logger.info(f"Reading directory: {full_path}")
     
-    if not os.path.exists(full_path):
+    if not await anyio.to_thread.run_sync(os.path.exists, full_path):
         logger.error(f"Path not found: {full_path}")
         raise HTTPException(status_code=404, detail=f"Path not found: {path}")
 
-    def scan_dir(dir_path: str) -> FileInfo:
-        name = os.path.basename(dir_path) or os.path.basename(VAULT_PATH)
-        rel_path = os.path.relpath(dir_path, VAULT_PATH)
-        rel_path = "" if rel_path == "." else rel_path
-        
-        children = []
-        if os.path.isdir(dir_path):
-            for item in sorted(os.listdir(dir_path)):
-                if not item.startswith('.'):
-                    item_path = os.path.join(dir_path, item)
-                    children.append(scan_dir(item_path))
-
-        return FileInfo(
-            name=name,
-            path=rel_path,
-            type="directory" if os.path.isdir(dir_path) else "file",
-            modified=datetime.fromtimestamp(os.path.getmtime(dir_path)),
-            children=children if os.path.isdir(dir_path) else None
-        )
-
-    return scan_dir(full_path)
+    executor = search_manager.executor if search_manager else None
+    return await anyio.to_thread.run_sync(scan_dir, full_path, depth, executor)
 
 @app.get("/api/files/{path:path}", response_model=FileContent)
-async def get_file_content(path: str):
-    """Get content of a specific file"""
+async def get_file_content(path: str, request: Request, response: Response):
+    """Get content of a specific file, answering 304 when the client's copy is current"""
     full_path = os.path.join(VAULT_PATH, path.lstrip("/"))
     logger.info(f"Reading file: {full_path}")
     
-    if not os.path.exists(full_path):
+    try:
+        headers, parsed = await anyio.to_thread.run_sync(
+            _read_file, full_path,
+            request.headers.get("if-none-match"), request.headers.get("if-modified-since")
+        )
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
-    
-    if not os.path.isfile(full_path):
+    except IsADirectoryError:
         raise HTTPException(status_code=400, detail="Path is not a file")
-    
-    try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        frontmatter = {}
-        if content.startswith('---'):
-            try:
-                _, fm, md = content.split('---', 2)
-                frontmatter = yaml.safe_load(fm)
-                content = md.strip()
-            except:
-                pass
-                
-        return FileContent(content=content, frontmatter=frontmatter)
     except Exception as e:
         logger.error(f"Error reading file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if parsed is None:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    content, frontmatter = parsed
+    return FileContent(content=content, frontmatter=frontmatter)
+
 @app.post("/api/files/{path:path}")
 async def create_file(path: str, file_content: FileContent):
     """Create a new file"""
     full_path = os.path.join(VAULT_PATH, path.lstrip("/"))
     logger.info(f"Creating file: {full_path}")
     
-    if os.path.exists(full_path):
+    if await anyio.to_thread.run_sync(os.path.exists, full_path):
         raise HTTPException(status_code=409, detail="File already exists")
     
     try:
         # Ensure parent directory exists
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        await anyio.to_thread.run_sync(
+            functools.partial(os.makedirs, os.path.dirname(full_path), exist_ok=True)
+        )
         
         # Prepare content with frontmatter
         content = ""
         if file_content.frontmatter:
             content = "---\n"
-            content += yaml.dump(file_content.frontmatter)
+            content += yaml.dump(file_content.frontmatter, Dumper=SafeDumper)
             content += "---\n"
         content += file_content.content
         
         # Write file
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        await anyio.to_thread.run_sync(_write_file, full_path, content)
             
         return {"status": "success", "path": path}
     except Exception as e:
@@ -191,22 +291,21 @@ async def update_file(path: str, file_content: FileContent):
     full_path = os.path.join(VAULT_PATH, path.lstrip("/"))
     logger.info(f"Updating file: {full_path}")
     
-    if not os.path.exists(full_path):
+    if not await anyio.to_thread.run_sync(os.path.exists, full_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    if not os.path.isfile(full_path):
+    if not await anyio.to_thread.run_sync(os.path.isfile, full_path):
         raise HTTPException(status_code=400, detail="Path is not a file")
     
     try:
         content = ""
         if file_content.frontmatter:
             content = "---\n"
-            content += yaml.dump(file_content.frontmatter)
+            content += yaml.dump(file_content.frontmatter, Dumper=SafeDumper)
             content += "---\n"
         content += file_content.content
         
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        await anyio.to_thread.run_sync(_write_file, full_path, content)
             
         return {"status": "success", "path": path}
     except Exception as e:
@@ -223,15 +322,17 @@ async def move_file(path: str, new_path: str = None):
     new_full_path = os.path.join(VAULT_PATH, new_path.lstrip("/"))
     logger.info(f"Moving file from {full_path} to {new_full_path}")
     
-    if not os.path.exists(full_path):
+    if not await anyio.to_thread.run_sync(os.path.exists, full_path):
         raise HTTPException(status_code=404, detail="Source path not found")
     
-    if os.path.exists(new_full_path):
+    if await anyio.to_thread.run_sync(os.path.exists, new_full_path):
         raise HTTPException(status_code=409, detail="Destination path already exists")
     
     try:
-        os.makedirs(os.path.dirname(new_full_path), exist_ok=True)
-        os.rename(full_path, new_full_path)
+        await anyio.to_thread.run_sync(
+            functools.partial(os.makedirs, os.path.dirname(new_full_path), exist_ok=True)
+        )
+        await anyio.to_thread.run_sync(os.rename, full_path, new_full_path)
         return {"status": "success", "from": path, "to": new_path}
     except Exception as e:
         logger.error(f"Error moving file: {str(e)}")
@@ -1,25 +1,150 @@
+import functools
 import logging
+import os
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 import threading
 import time
-import json
+import sqlite3
+from stat import S_ISREG
 from datetime import datetime
-import warnings
-
-# Suppress Whoosh warning
-warnings.filterwarnings("ignore", category=SyntaxWarning, module="whoosh.codec.whoosh3")
 
+import tantivy
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from whoosh.index import create_in, open_dir
-from whoosh.fields import Schema, TEXT, ID, DATETIME
-from whoosh.qparser import QueryParser
 from pypdf import PdfReader
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 
+# Directory walks only fan out to the thread pool when the top level has at
+# least this many subdirectories; smaller trees are cheaper to scan serially.
+PARALLEL_SCAN_THRESHOLD = 4
+
+# Changes are only indexed once a file has been quiet for this many seconds, so
+# bursts of saves to the same file are coalesced into a single index update.
+DEBOUNCE_SECONDS = 0.5
+
+# Changes that failed to index are requeued and retried after this many seconds
+RETRY_SECONDS = 3
+
+# The shared index writer is committed when the watcher runs out of queued changes,
+# and otherwise once this many documents are pending or its oldest uncommitted
+# change is this many seconds old, whichever comes first.
+COMMIT_BATCH_DOCS = 500
+COMMIT_INTERVAL_SECONDS = 5
+
+# Search previews and highlights only consider this many leading characters of a file
+PREVIEW_TEXT_LIMIT = 64 * 1024
+
+# Memory budget for the Tantivy index writer, shared across its indexing threads
+WRITER_HEAP_SIZE = 128_000_000
+
+def walk_directories(
+    root: Any,
+    visit: Callable[[Any], Tuple[List[Any], Any]],
+    executor: Optional[ThreadPoolExecutor] = None
+) -> Iterator[Any]:
+    """Walk a directory tree, yielding the result of visit() for every directory.
+
+    visit(item) scans a single directory and returns (subdirs, result), where
+    subdirs are the items to descend into. With an executor, directories are
+    scanned concurrently and results are yielded on the calling thread.
+    """
+    subdirs, result = visit(root)
+    yield result
+
+    if executor is None or len(subdirs) < PARALLEL_SCAN_THRESHOLD:
+        stack = list(subdirs)
+        while stack:
+            subdirs, result = visit(stack.pop())
+            stack.extend(subdirs)
+            yield result
+        return
+
+    results: queue.Queue = queue.Queue()
+
+    def task(item):
+        try:
+            results.put((visit(item), None))
+        except Exception as e:
+            results.put((None, e))
+
+    outstanding = 0
+    for item in subdirs:
+        executor.submit(task, item)
+        outstanding += 1
+
+    while outstanding:
+        visited, error = results.get()
+        outstanding -= 1
+        if error is not None:
+            raise error
+        subdirs, result = visited
+        for item in subdirs:
+            executor.submit(task, item)
+            outstanding += 1
+        yield result
+
+def _extract_pdf_text(pdf_path: Path) -> str:
+    """Extract text from PDF file"""
+    try:
+        reader = PdfReader(str(pdf_path))
+        return "".join((page.extract_text() or "") + "\n" for page in reader.pages)
+    except Exception as e:
+        logger.error(f"Error extracting PDF text from {pdf_path}: {e}")
+        return ""
+
+@functools.lru_cache(maxsize=256)
+def _extract_pdf_preview(path: str, mtime_ns: int, size: int) -> str:
+    """Extract the leading text of a PDF for previews, cached on (path, mtime, size)"""
+    parts = []
+    length = 0
+    try:
+        reader = PdfReader(path)
+        for page in reader.pages:
+            text = (page.extract_text() or "") + "\n"
+            parts.append(text)
+            length += len(text)
+            if length >= PREVIEW_TEXT_LIMIT:
+                break
+    except Exception as e:
+        logger.error(f"Error extracting PDF preview from {path}: {e}")
+    return "".join(parts)[:PREVIEW_TEXT_LIMIT]
+
+def _require_all_terms(query: str) -> str:
+    """Mark each top-level term as required, matching Whoosh's default AND.
+
+    Queries that already use AND/OR/NOT are left to the parser as written.
+    """
+    tokens = []
+    current = ""
+    depth = 0
+    in_quote = False
+    for char in query:
+        if char == '"':
+            in_quote = not in_quote
+        elif not in_quote and char == '(':
+            depth += 1
+        elif not in_quote and char == ')':
+            depth = max(0, depth - 1)
+        if char.isspace() and not in_quote and depth == 0:
+            if current:
+                tokens.append(current)
+            current = ""
+        else:
+            current += char
+    if current:
+        tokens.append(current)
+
+    if any(token in ("AND", "OR", "NOT") for token in tokens):
+        return query
+    return " ".join(token if token[0] in "+-" else "+" + token for token in tokens)
+
 class SearchResult(BaseModel):
     path: str
     content_preview: str
@@ -29,27 +154,54 @@ class SearchResult(BaseModel):
 class VaultChangeHandler(FileSystemEventHandler):
     def __init__(self, search_manager):
         self.search_manager = search_manager
-        self.pending_changes: Set[Path] = set()
+        self.pending_changes: Dict[Path, float] = {}
         self._lock = threading.Lock()
         self._running = True
+        self._wake = threading.Event()
         logger.info("VaultChangeHandler initialized")
         # Start background processing thread
         self._thread = threading.Thread(target=self._process_loop, daemon=True)
         self._thread.start()
 
     def _process_loop(self):
-        """Continuously process pending changes"""
+        """Process pending changes as soon as they have been quiet for DEBOUNCE_SECONDS"""
+        timeout = None
         while self._running:
+            # Block until a change is queued, or until the next pending change is due
+            self._wake.wait(timeout)
+            self._wake.clear()
+            ready = set()
             try:
+                now = time.monotonic()
                 with self._lock:
+                    ready = {path for path, ts in self.pending_changes.items()
+                             if now - ts >= DEBOUNCE_SECONDS}
+                    for path in ready:
+                        del self.pending_changes[path]
+                    timeout = None
                     if self.pending_changes:
-                        logger.info(f"Processing {len(self.pending_changes)} pending changes")
-                        self.search_manager.index_specific_files(self.pending_changes)
-                        self.pending_changes.clear()
-                        logger.info("Successfully processed changes")
+                        due = min(self.pending_changes.values()) + DEBOUNCE_SECONDS
+                        timeout = max(0.0, due - now)
+
+                if ready:
+                    logger.info(f"Processing {len(ready)} pending changes")
+                    self.search_manager.index_specific_files(ready)
+                    logger.info("Successfully processed changes")
+
+                    # Make the batch searchable right away unless more changes are
+                    # queued; COMMIT_INTERVAL_SECONDS then bounds how long they wait
+                    with self._lock:
+                        idle = not self.pending_changes
+                    if idle:
+                        self.search_manager.commit()
             except Exception as e:
                 logger.error(f"Error in process loop: {e}")
-            time.sleep(3)  # Wait 3 seconds between checks
+                if ready:
+                    # Keep any newer event time for paths that changed again meanwhile
+                    with self._lock:
+                        for path in ready:
+                            self.pending_changes.setdefault(path, now)
+                    timeout = RETRY_SECONDS if timeout is None else min(timeout, RETRY_SECONDS)
 
     def on_created(self, event):
         if event.is_directory:
@@ -63,22 +215,33 @@ class VaultChangeHandler(FileSystemEventHandler):
         logger.info(f"File modified: {event.src_path}")
         self._handle_change(event.src_path)
 
+    def _is_hidden(self, path: Path) -> bool:
+        """Check whether a file or any of its folders inside the vault is hidden"""
+        try:
+            path = path.absolute().relative_to(self.search_manager.vault_path.absolute())
+        except ValueError:
+            pass
+        return any(part.startswith('.') for part in path.parts)
+
     def _handle_change(self, file_path: str):
         path = Path(file_path)
-        if path.suffix.lower() in ['.md', '.txt', '.pdf'] and not path.name.startswith('.'):
+        # Mirrors check_consistency, which skips hidden files and hidden folders
+        if path.suffix.lower() in ['.md', '.txt', '.pdf'] and not self._is_hidden(path):
             logger.info(f"Queueing change for: {path}")
             try:
                 if not path.is_absolute():
                     path = path.absolute()
                 with self._lock:
-                    self.pending_changes.add(path)
+                    self.pending_changes[path] = time.monotonic()
                     logger.info("Change queued successfully")
+                self._wake.set()
             except Exception as e:
                 logger.error(f"Error handling change for {path}: {str(e)}")
 
     def shutdown(self):
         """Stop the background processing"""
         self._running = False
+        self._wake.set()
         self._thread.join(timeout=5)
         logger.info("VaultChangeHandler shutdown complete")
 
@@ -87,32 +250,63 @@ class SearchManager:
         self.vault_path = Path(vault_path)
         self.index_path = Path(index_path)
         self.state_file = self.index_path / "index_state.json"
-        self.schema = Schema(
-            path=ID(stored=True, unique=True),
-            content=TEXT(stored=True),
-            modified=DATETIME(stored=True)
-        )
+        self.state_db = self.index_path / "index_state.sqlite"
+        schema_builder = tantivy.SchemaBuilder()
+        schema_builder.add_text_field("path", stored=True, tokenizer_name="raw")
+        schema_builder.add_text_field("content", stored=False)
+        schema_builder.add_date_field("modified", stored=True)
+        self.schema = schema_builder.build()
+        self._writer_lock = threading.Lock()
+        self._dirty = False
+        self._writer_started = 0.0
+        self._pending_docs = 0
+        self._pending_state: Dict[str, Tuple[int, int]] = {}
+        self._pending_deletes: Set[str] = set()
+        self._searcher_lock = threading.Lock()
+        self._stop_commits = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+        self._pdf_pool_lock = threading.Lock()
+        self._pdf_pool = self._new_pdf_pool()
         logger.info(f"Initializing SearchManager with vault path: {vault_path}")
         
         self.setup_index()
+        self.setup_state()
         self.setup_file_watcher()
         self.check_consistency()  # Initial indexing
 
+        self._commit_thread = threading.Thread(target=self._commit_loop, daemon=True)
+        self._commit_thread.start()
+
     def setup_index(self):
         """Ensure index exists and is properly initialized"""
         try:
             self.index_path.mkdir(parents=True, exist_ok=True)
             
-            try:
-                open_dir(str(self.index_path))
-                logger.info("Using existing search index")
-            except:
-                create_in(str(self.index_path), self.schema)
+            self._index_created = not tantivy.Index.exists(str(self.index_path))
+            if self._index_created:
+                self._remove_whoosh_files()
+            self.idx = tantivy.Index(self.schema, path=str(self.index_path))
+            if self._index_created:
                 logger.info("Created new search index")
+            else:
+                logger.info("Using existing search index")
+
+            self._writer = self.idx.writer(heap_size=WRITER_HEAP_SIZE)
+            self._searcher = self.idx.searcher()
         except Exception as e:
             logger.error(f"Error setting up index: {e}")
             raise
 
+    def _remove_whoosh_files(self):
+        """Delete the TOC, segment and lock files of a legacy Whoosh index"""
+        for pattern in ("_MAIN_*.toc", "MAIN_*"):
+            for path in self.index_path.glob(pattern):
+                try:
+                    path.unlink()
+                    logger.info(f"Removed legacy Whoosh index file: {path.name}")
+                except OSError as e:
+                    logger.error(f"Error removing legacy Whoosh index file {path}: {e}")
+
     def setup_file_watcher(self):
         """Setup real-time file system monitoring"""
         try:
@@ -125,62 +319,136 @@ class SearchManager:
             logger.error(f"Error setting up file watcher: {e}")
             raise
 
+    def setup_state(self):
+        """Open the index state database, discarding state kept in legacy formats"""
+        try:
+            self._state_lock = threading.Lock()
+            self._state_db = sqlite3.connect(str(self.state_db), check_same_thread=False)
+            self._state_db.execute("PRAGMA journal_mode=WAL")
+            self._state_db.execute("PRAGMA synchronous=NORMAL")
+
+            # Legacy state stores string hashes and only ever described the old
+            # Whoosh index, so it is dropped rather than converted
+            columns = [row[1] for row in self._state_db.execute("PRAGMA table_info(index_state)")]
+            with self._state_db:
+                if "hash" in columns:
+                    self._state_db.execute("DROP TABLE index_state")
+                    logger.info("Dropped legacy index state table")
+                self._state_db.execute(
+                    "CREATE TABLE IF NOT EXISTS index_state "
+                    "(rel_path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER)"
+                )
+
+            if self.state_file.exists():
+                self.state_file.unlink()
+                logger.info("Removed legacy JSON index state")
+
+            # State left over from a previous index (e.g. the old Whoosh one)
+            # would stop check_consistency from populating a fresh index
+            if self._index_created:
+                with self._state_lock, self._state_db:
+                    self._state_db.execute("DELETE FROM index_state")
+        except Exception as e:
+            logger.error(f"Error setting up index state: {e}")
+            raise
+
     def load_index_state(self) -> Dict:
         """Load the saved state of indexed files"""
         try:
-            if self.state_file.exists():
-                with open(self.state_file, 'r') as f:
-                    return json.load(f)
-            return {}
+            with self._state_lock:
+                return {rel_path: (mtime_ns, size) for rel_path, mtime_ns, size in
+                        self._state_db.execute("SELECT rel_path, mtime_ns, size FROM index_state")}
         except Exception as e:
             logger.error(f"Error loading index state: {e}")
             return {}
 
-    def save_index_state(self, state: Dict):
-        """Save the current state of indexed files"""
+    def save_index_state(self, changes: Dict):
+        """Save the state of changed files"""
         try:
-            with open(self.state_file, 'w') as f:
-                json.dump(state, f)
+            with self._state_lock, self._state_db:
+                self._state_db.executemany(
+                    "INSERT OR REPLACE INTO index_state (rel_path, mtime_ns, size) VALUES (?, ?, ?)",
+                    ((rel_path, mtime_ns, size) for rel_path, (mtime_ns, size) in changes.items())
+                )
         except Exception as e:
             logger.error(f"Error saving index state: {e}")
 
-    def get_file_hash(self, file_path: Path) -> str:
-        """Get a hash of file's content and metadata"""
+    def delete_index_state(self, paths: Set[str]):
+        """Remove files from the saved state"""
         try:
-            stat = file_path.stat()
-            return f"{stat.st_mtime}_{stat.st_size}"
+            with self._state_lock, self._state_db:
+                self._state_db.executemany(
+                    "DELETE FROM index_state WHERE rel_path = ?",
+                    ((path,) for path in paths)
+                )
         except Exception as e:
-            logger.error(f"Error getting file hash: {e}")
-            return ""
+            logger.error(f"Error deleting index state: {e}")
+
+    @staticmethod
+    def _stat_hash(stat: os.stat_result) -> Tuple[int, int]:
+        """Derive a file's hash from its stat result"""
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _new_pdf_pool() -> ProcessPoolExecutor:
+        """Create the process pool used for PDF text extraction"""
+        # Spawned rather than forked, since this process already runs watcher threads
+        return ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _replace_broken_pdf_pool(self, broken: ProcessPoolExecutor):
+        """Swap in a fresh PDF pool after a worker died, unless another thread already did"""
+        with self._pdf_pool_lock:
+            if self._pdf_pool is broken:
+                logger.warning("PDF extraction pool broke, starting a new one")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pdf_pool = self._new_pdf_pool()
 
-    def _extract_pdf_text(self, pdf_path: Path) -> str:
-        """Extract text from PDF file"""
+    def _submit_pdf(self, file_path: Path):
+        """Submit a PDF for extraction, replacing the pool once if it is broken"""
+        pool = self._pdf_pool
         try:
-            reader = PdfReader(str(pdf_path))
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        except Exception as e:
-            logger.error(f"Error extracting PDF text from {pdf_path}: {e}")
-            return ""
+            return pool, pool.submit(_extract_pdf_text, file_path)
+        except BrokenProcessPool:
+            self._replace_broken_pdf_pool(pool)
+            pool = self._pdf_pool
+            return pool, pool.submit(_extract_pdf_text, file_path)
+
+    def _index_file(self, file_path: Path, content: str, stat: os.stat_result):
+        """Write a single file's content to the index. Caller must hold _writer_lock.
 
-    def _index_file(self, writer, file_path: Path):
-        """Index a single file"""
+        stat must be taken before the content was read. If the file has changed
+        since, the content is stale and is skipped; the edit has its own watcher
+        event, which indexes the newer content.
+        """
         try:
-            if file_path.suffix.lower() == '.pdf':
-                content = self._extract_pdf_text(file_path)
-            else:  # Markdown or other text files
-                content = file_path.read_text(encoding='utf-8')
-            
             rel_path = str(file_path.relative_to(self.vault_path))
-            logger.info(f"Indexing file: {rel_path}")
+
+            if self._stat_hash(file_path.stat()) != self._stat_hash(stat):
+                logger.info(f"Skipping stale content for {rel_path}, file changed while reading")
+                return
+
+            writer = self._get_writer()
             
-            writer.update_document(
+            logger.info(f"Writing to index: {rel_path} (content length: {len(content)})")
+            # Always delete by path first, so a stale copy left behind by a lost
+            # state write can never become a duplicate. Deletes only apply to
+            # documents added before them, including earlier in this batch.
+            writer.delete_documents("path", rel_path)
+            writer.add_document(tantivy.Document(
                 path=rel_path,
                 content=content,
-                modified=datetime.fromtimestamp(file_path.stat().st_mtime)
-            )
+                modified=datetime.fromtimestamp(stat.st_mtime)
+            ))
+            self._pending_state[rel_path] = self._stat_hash(stat)
+            self._pending_deletes.discard(rel_path)
+            self._pending_docs += 1
+            logger.info(f"Successfully added to index: {rel_path}")
+
+            if self._pending_docs >= COMMIT_BATCH_DOCS:
+                self._commit_writer()
         except Exception as e:
             logger.error(f"Error indexing {file_path}: {e}")
 
@@ -188,37 +456,58 @@ class SearchManager:
         """Index specific files and update state"""
         logger.info(f"Starting indexing of {len(file_paths)} files")
         try:
-            idx = open_dir(str(self.index_path))
-            state = self.load_index_state()
-            logger.info("Opened index and loaded state")
-            
-            with idx.writer() as writer:
-                for file_path in file_paths:
+            # PDFs are extracted in worker processes while text files are indexed
+            text_paths = []
+            pdf_futures = {}
+            for file_path in file_paths:
+                try:
+                    stat = file_path.stat()
+                except FileNotFoundError:
+                    stat = None
+                if stat is None or not S_ISREG(stat.st_mode):
+                    logger.info(f"File doesn't exist: {file_path}")
+                    continue
+                if file_path.suffix.lower() == '.pdf':
                     try:
-                        if not file_path.exists():
-                            logger.info(f"File doesn't exist: {file_path}")
-                            continue
-
-                        if file_path.is_file():
-                            try:
-                                content = file_path.read_text(encoding='utf-8')
-                                rel_path = str(file_path.relative_to(self.vault_path))
-                                
-                                logger.info(f"Writing to index: {rel_path} (content length: {len(content)})")
-                                writer.add_document(
-                                    path=rel_path,
-                                    content=content,
-                                    modified=datetime.fromtimestamp(file_path.stat().st_mtime)
-                                )
-                                state[rel_path] = self.get_file_hash(file_path)
-                                logger.info(f"Successfully added to index: {rel_path}")
-                            except Exception as e:
-                                logger.error(f"Error reading or indexing file {file_path}: {e}")
+                        pool, future = self._submit_pdf(file_path)
                     except Exception as e:
-                        logger.error(f"Error processing file {file_path}: {e}")
-            
-            self.save_index_state(state)
-            logger.info("Successfully saved index state")
+                        logger.error(f"Error submitting PDF {file_path} for extraction: {e}")
+                        continue
+                    pdf_futures[future] = (file_path, pool, stat)
+                else:
+                    text_paths.append(file_path)
+
+            # Files are read and PDFs awaited without the writer lock, which is
+            # only held while each document is added
+            for file_path in text_paths:
+                try:
+                    stat = file_path.stat()
+                    content = file_path.read_text(encoding='utf-8')
+                except Exception as e:
+                    logger.error(f"Error reading file {file_path}: {e}")
+                    continue
+                with self._writer_lock:
+                    self._index_file(file_path, content, stat)
+
+            for future in as_completed(pdf_futures):
+                file_path, pool, stat = pdf_futures[future]
+                try:
+                    content = future.result()
+                except BrokenProcessPool as e:
+                    # The PDF that crashed a worker cannot be told apart from the
+                    # others in flight, so all of them are skipped until the next scan
+                    logger.error(f"PDF extraction worker died while processing {file_path}: {e}")
+                    self._replace_broken_pdf_pool(pool)
+                    continue
+                except Exception as e:
+                    logger.error(f"Error extracting PDF text from {file_path}: {e}")
+                    continue
+                with self._writer_lock:
+                    self._index_file(file_path, content, stat)
+
+            with self._writer_lock:
+                if self._dirty and time.monotonic() - self._writer_started >= COMMIT_INTERVAL_SECONDS:
+                    self._commit_writer()
             
         except Exception as e:
             logger.error(f"Error in index_specific_files: {e}", exc_info=True)
@@ -228,24 +517,47 @@ class SearchManager:
         """Check if index matches current file system state"""
         current_state = self.load_index_state()
         files_to_update = set()
-        
-        for file_path in self.vault_path.rglob('*'):
-            if file_path.is_file() and not file_path.name.startswith('.'):
-                if file_path.suffix.lower() in ['.md', '.txt', '.pdf']:
-                    try:
-                        rel_path = str(file_path.relative_to(self.vault_path))
-                        current_hash = self.get_file_hash(file_path)
-                        
-                        if rel_path not in current_state or current_state[rel_path] != current_hash:
-                            files_to_update.add(file_path)
-                    except Exception as e:
-                        logger.error(f"Error checking file {file_path}: {e}")
+
+        existing_paths = set()
+        vault_root_len = len(os.path.join(str(self.vault_path), ""))
+
+        def visit(dir_path: str):
+            subdirs = []
+            existing = []
+            changed = {}
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        if os.path.splitext(entry.name)[1].lower() in ['.md', '.txt', '.pdf']:
+                            try:
+                                rel_path = entry.path[vault_root_len:]
+                                current_hash = self._stat_hash(entry.stat())
+                                existing.append(rel_path)
+
+                                if current_state.get(rel_path) != current_hash:
+                                    changed[rel_path] = entry.path
+                            except Exception as e:
+                                logger.error(f"Error checking file {entry.path}: {e}")
+            except OSError as e:
+                # Skip unreadable or vanished directories rather than aborting the scan
+                logger.error(f"Error scanning directory {dir_path}: {e}")
+                return [], ([], {})
+            return subdirs, (existing, changed)
+
+        # One pass collects both the files that changed and the files that still exist
+        for existing, changed in walk_directories(str(self.vault_path), visit, self.executor):
+            existing_paths.update(existing)
+            files_to_update.update(Path(path) for path in changed.values())
 
         # Check for deleted files
         indexed_paths = set(current_state.keys())
-        existing_paths = {str(p.relative_to(self.vault_path)) 
-                         for p in self.vault_path.rglob('*') 
-                         if p.is_file()}
         deleted_paths = indexed_paths - existing_paths
 
         if deleted_paths:
@@ -256,43 +568,109 @@ class SearchManager:
             logger.info(f"Found {len(files_to_update)} files to update")
             self.index_specific_files(files_to_update)
 
+        self.commit()
+
     def remove_deleted_files(self, paths: Set[str]):
         """Remove deleted files from the index"""
         try:
-            idx = open_dir(str(self.index_path))
-            state = self.load_index_state()
-            
-            with idx.writer() as writer:
+            with self._writer_lock:
+                writer = self._get_writer()
                 for path in paths:
-                    writer.delete_by_term('path', path)
-                    state.pop(path, None)
+                    writer.delete_documents("path", path)
+                    self._pending_deletes.add(path)
+                    self._pending_state.pop(path, None)
                     logger.info(f"Removed deleted file from index: {path}")
             
-            self.save_index_state(state)
-            
         except Exception as e:
             logger.error(f"Error removing deleted files: {e}")
 
+    def _get_writer(self):
+        """Return the shared index writer, starting a pending batch if needed. Caller must hold _writer_lock."""
+        if not self._dirty:
+            self._dirty = True
+            self._writer_started = time.monotonic()
+        return self._writer
+
+    def _commit_writer(self):
+        """Commit the shared writer and persist its state. Caller must hold _writer_lock."""
+        if not self._dirty:
+            return
+
+        self._writer.commit()
+        self._dirty = False
+        self.save_index_state(self._pending_state)
+        self.delete_index_state(self._pending_deletes)
+        logger.info(f"Committed {self._pending_docs} documents to index")
+        self._pending_state = {}
+        self._pending_deletes = set()
+        self._pending_docs = 0
+        self._refresh_searcher()
+
+    def commit(self):
+        """Commit any pending index changes immediately"""
+        with self._writer_lock:
+            self._commit_writer()
+
+    def _commit_loop(self):
+        """Commit changes left pending by small batches once they are old enough"""
+        while not self._stop_commits.wait(1):
+            try:
+                with self._writer_lock:
+                    if (self._dirty and
+                            time.monotonic() - self._writer_started >= COMMIT_INTERVAL_SECONDS):
+                        self._commit_writer()
+            except Exception as e:
+                logger.error(f"Error committing index: {e}")
+
+    def _refresh_searcher(self):
+        """Point the shared searcher at the latest committed index state"""
+        self.idx.reload()
+        with self._searcher_lock:
+            self._searcher = self.idx.searcher()
+
+    def _read_indexed_text(self, rel_path: str) -> str:
+        """Read the leading text that was indexed for a file, for building previews"""
+        file_path = self.vault_path / rel_path
+        try:
+            if file_path.suffix.lower() == '.pdf':
+                stat = file_path.stat()
+                return _extract_pdf_preview(str(file_path), stat.st_mtime_ns, stat.st_size)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return f.read(PREVIEW_TEXT_LIMIT)
+        except Exception as e:
+            logger.error(f"Error reading {file_path} for preview: {e}")
+            return ""
+
     def search(self, query: str, limit: int = 10) -> List[SearchResult]:
         """Search the index"""
         try:
-            idx = open_dir(str(self.index_path))
             results = []
             
-            with idx.searcher() as searcher:
-                logger.info(f"Searching for query: {query}")
-                query = QueryParser("content", idx.schema).parse(query)
-                search_results = searcher.search(query, limit=limit)
-                logger.info(f"Found {len(search_results)} results")
-                
-                for hit in search_results:
-                    preview = hit.highlights("content") or hit["content"][:200] + "..."
-                    results.append(SearchResult(
-                        path=hit['path'],
-                        content_preview=preview,
-                        score=hit.score,
-                        modified=hit['modified']
-                    ))
+            with self._searcher_lock:
+                searcher = self._searcher
+
+            logger.info(f"Searching for query: {query}")
+            # Lenient parsing keeps input the strict parser rejects searchable,
+            # such as "TODO: fix" or unbalanced quotes and parentheses
+            query, errors = self.idx.parse_query_lenient(_require_all_terms(query), ["content"])
+            if errors:
+                logger.info(f"Ignored query syntax errors: {errors}")
+            search_results = searcher.search(query, limit).hits
+            logger.info(f"Found {len(search_results)} results")
+
+            snippets = tantivy.SnippetGenerator.create(searcher, query, self.schema, "content")
+            for score, address in search_results:
+                hit = searcher.doc(address)
+                path = hit.get_first("path")
+                text = self._read_indexed_text(path)
+                preview = (snippets.snippet_from_doc(tantivy.Document(content=text)).to_html()
+                           or text[:200] + "...")
+                results.append(SearchResult(
+                    path=path,
+                    content_preview=preview,
+                    score=score,
+                    modified=hit.get_first("modified")
+                ))
             
             return results
         except Exception as e:
@@ -306,6 +684,13 @@ class SearchManager:
                 self.event_handler.shutdown()
             self.observer.stop()
             self.observer.join()
+            self._stop_commits.set()
+            self._commit_thread.join(timeout=5)
+            self.commit()
+            self._writer.wait_merging_threads()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self._pdf_pool.shutdown(wait=False, cancel_futures=True)
+            self._state_db.close()
             logger.info("Search manager shutdown complete")
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
\ No newline at end of file